@@ -1,11 +1,16 @@
-from flask import Flask, request, jsonify, render_template, send_file
+from flask import Flask, request, jsonify, render_template, send_file, g
 from flask_cors import CORS
 import os
+import hmac
+import uuid
+from functools import wraps
 from dotenv import load_dotenv
 import json
 from datetime import datetime
 from audio_processor import AudioProcessor
 from llm_processor import LLMProcessor
+from profiler import ProfileManager, ProfileStore
+from state_store import StateStore
 
 # Load environment variables
 load_dotenv()
@@ -13,12 +18,85 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
+# Conversations and TTS cache metadata shared by all worker processes
+state_store = StateStore(
+    db_path=os.environ.get('STATE_DB_PATH', 'chatbot_state.db'),
+    freshness_seconds=float(os.environ.get('STATE_CACHE_FRESHNESS', 1.0))
+)
+
 # Initialize processors
-audio_processor = AudioProcessor()
+audio_processor = AudioProcessor(state_store=state_store)
 llm_processor = LLMProcessor()
 
-# In-memory storage for conversations (in production, use a database)
-conversations = {}
+# Replies worth synthesizing before anyone asks for them
+DEFAULT_PRERENDER_PHRASES = [
+    "Hello! How can I help you today?",
+    "Could not understand audio. Please speak more clearly.",
+    "No speech detected",
+    "Could not process audio format. Please try recording again.",
+]
+
+def load_prerender_phrases():
+    """Collect configured phrases plus the most frequent past bot replies"""
+    phrases_file = os.environ.get('PRERENDER_PHRASES_FILE')
+    if phrases_file:
+        try:
+            with open(phrases_file, 'r') as f:
+                phrases = [line.strip() for line in f if line.strip()]
+        except Exception as e:
+            print(f"Error reading pre-render phrases: {str(e)}")
+            phrases = list(DEFAULT_PRERENDER_PHRASES)
+    else:
+        phrases = list(DEFAULT_PRERENDER_PHRASES)
+    
+    top_n = int(os.environ.get('PRERENDER_TOP_N', 20))
+    if top_n > 0:
+        phrases += state_store.most_frequent_messages(sender='bot', limit=top_n)
+    
+    # Keep order but drop duplicates
+    return list(dict.fromkeys(phrases))
+
+if os.environ.get('PRERENDER_TTS', 'true').lower() in ('1', 'true', 'yes'):
+    audio_processor.start_prerender(load_prerender_phrases)
+
+# Opt-in request profiling (X-Profile: 1 header or PROFILE_SAMPLE_RATE)
+profile_manager = ProfileManager(
+    ProfileStore(
+        profile_dir=os.environ.get('PROFILE_DIR', 'profiles'),
+        max_profiles=int(os.environ.get('PROFILE_MAX_FILES', 50))
+    ),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+)
+
+def profiled(endpoint):
+    """Profile the wrapped view when the request opts in or is sampled"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+            g.profile = profile_manager.start(request_id, endpoint, request.headers,
+                                              header_allowed=admin_authorized())
+            try:
+                response = view(*args, **kwargs)
+            finally:
+                profile_id = profile_manager.finish(g.profile)
+            if profile_id:
+                response = app.make_response(response)
+                response.headers['X-Profile-ID'] = profile_id
+            return response
+        return wrapper
+    return decorator
+
+def profile_stage(name):
+    """Mark a stage boundary in the current request's profile"""
+    return g.profile.stage(name)
+
+def admin_authorized():
+    """Check the admin token; admin features are disabled when none is configured"""
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if not admin_token:
+        return False
+    return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token)
 
 @app.route('/')
 def index():
@@ -26,6 +104,7 @@ def index():
     return render_template('index.html')
 
 @app.route('/api/chat', methods=['POST'])
+@profiled('chat')
 def chat():
     """Handle chat messages"""
     try:
@@ -37,30 +116,15 @@ def chat():
         if not message:
             return jsonify({'error': 'Message is required'}), 400
         
-        # Get or create conversation
-        if conversation_id not in conversations:
-            conversations[conversation_id] = []
-        
-        # Add user message to conversation
-        user_message = {
-            'id': len(conversations[conversation_id]) + 1,
-            'sender': 'user',
-            'message': message,
-            'timestamp': datetime.now().isoformat()
-        }
-        conversations[conversation_id].append(user_message)
+        # Add user message to conversation (created if needed)
+        state_store.append_message(conversation_id, 'user', message)
         
         # Get bot response using LLM processor
-        bot_response = llm_processor.generate_response(message, conversation_id, use_cohere)
+        with profile_stage('llm'):
+            bot_response = llm_processor.generate_response(message, conversation_id, use_cohere)
         
         # Add bot response to conversation
-        bot_message = {
-            'id': len(conversations[conversation_id]) + 1,
-            'sender': 'bot',
-            'message': bot_response,
-            'timestamp': datetime.now().isoformat()
-        }
-        conversations[conversation_id].append(bot_message)
+        bot_message = state_store.append_message(conversation_id, 'bot', bot_response)
         
         return jsonify({
             'response': bot_response,
@@ -75,7 +139,7 @@ def chat():
 def get_conversation(conversation_id):
     """Get conversation history"""
     try:
-        conversation = conversations.get(conversation_id, [])
+        conversation = state_store.get_messages(conversation_id)
         return jsonify({
             'conversation_id': conversation_id,
             'messages': conversation
@@ -87,9 +151,10 @@ def get_conversation(conversation_id):
 def get_all_conversations():
     """Get all conversations"""
     try:
+        conversation_ids = state_store.list_conversations()
         return jsonify({
-            'conversations': list(conversations.keys()),
-            'count': len(conversations)
+            'conversations': conversation_ids,
+            'count': len(conversation_ids)
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -98,8 +163,7 @@ def get_all_conversations():
 def delete_conversation(conversation_id):
     """Delete a conversation"""
     try:
-        if conversation_id in conversations:
-            del conversations[conversation_id]
+        if state_store.delete_conversation(conversation_id):
             return jsonify({'message': 'Conversation deleted successfully'})
         else:
             return jsonify({'error': 'Conversation not found'}), 404
@@ -107,6 +171,7 @@ def delete_conversation(conversation_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/audio/speech-to-text', methods=['POST'])
+@profiled('speech_to_text')
 def speech_to_text():
     """Convert speech to text"""
     try:
@@ -117,7 +182,8 @@ def speech_to_text():
             return jsonify({'error': 'Audio data is required'}), 400
         
         # Convert speech to text
-        result = audio_processor.speech_to_text(audio_data=audio_data)
+        with profile_stage('speech_to_text'):
+            result = audio_processor.speech_to_text(audio_data=audio_data)
         
         return jsonify(result)
         
@@ -153,6 +219,7 @@ def text_to_speech():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/audio/chat', methods=['POST'])
+@profiled('audio_chat')
 def audio_chat():
     """Complete audio chat pipeline: speech-to-text -> LLM -> text-to-speech"""
     try:
@@ -165,42 +232,30 @@ def audio_chat():
             return jsonify({'error': 'Audio data is required'}), 400
         
         # Step 1: Convert speech to text
-        stt_result = audio_processor.speech_to_text(audio_data=audio_data)
+        with profile_stage('speech_to_text'):
+            stt_result = audio_processor.speech_to_text(audio_data=audio_data)
         if not stt_result['success']:
             return jsonify(stt_result), 400
         
         user_text = stt_result['text']
         
         # Step 2: Generate response using LLM
-        bot_response = llm_processor.generate_response(user_text, conversation_id, use_cohere)
+        with profile_stage('llm'):
+            bot_response = llm_processor.generate_response(user_text, conversation_id, use_cohere)
         
         # Step 3: Convert response to speech
-        tts_result = audio_processor.text_to_speech(bot_response, save_to_file=True)
+        with profile_stage('text_to_speech'):
+            tts_result = audio_processor.text_to_speech(bot_response, save_to_file=True)
         if not tts_result['success']:
             return jsonify(tts_result), 500
         
         # Convert audio file to base64
-        base64_audio = audio_processor.get_audio_base64(tts_result['audio_file'])
+        with profile_stage('encode_audio'):
+            base64_audio = audio_processor.get_audio_base64(tts_result['audio_file'])
         
         # Update conversation history
-        if conversation_id not in conversations:
-            conversations[conversation_id] = []
-        
-        user_message = {
-            'id': len(conversations[conversation_id]) + 1,
-            'sender': 'user',
-            'message': user_text,
-            'timestamp': datetime.now().isoformat()
-        }
-        conversations[conversation_id].append(user_message)
-        
-        bot_message = {
-            'id': len(conversations[conversation_id]) + 1,
-            'sender': 'bot',
-            'message': bot_response,
-            'timestamp': datetime.now().isoformat()
-        }
-        conversations[conversation_id].append(bot_message)
+        state_store.append_message(conversation_id, 'user', user_text)
+        bot_message = state_store.append_message(conversation_id, 'bot', bot_response)
         
         return jsonify({
             'success': True,
@@ -214,6 +269,30 @@ def audio_chat():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """List stored request profiles"""
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        profiles = profile_manager.store.list()
+        return jsonify({
+            'profiles': profiles,
+            'count': len(profiles)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Download a stored profile in collapsed-stack format"""
+    if not admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    collapsed = profile_manager.store.get_collapsed(profile_id)
+    if collapsed is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return app.response_class(collapsed, mimetype='text/plain')
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -8,12 +8,23 @@ from datetime import datetime
 import json
 import base64
 import io
+import hashlib
+import uuid
+import threading
 
 class AudioProcessor:
-    def __init__(self):
-        """Initialize audio processing components"""
+    def __init__(self, state_store=None):
+        """
+        Initialize audio processing components
+        
+        Args:
+            state_store: Optional StateStore used to share rendered TTS audio between workers
+        """
+        self.state_store = state_store
         self.recognizer = sr.Recognizer()
         self.engine = pyttsx3.init()
+        # pyttsx3 engines are not thread-safe, and pre-rendering runs in the background
+        self._engine_lock = threading.Lock()
         
         # Configure text-to-speech engine
         self.engine.setProperty('rate', 150)  # Speed of speech
@@ -24,6 +35,12 @@ class AudioProcessor:
         if voices:
             self.engine.setProperty('voice', voices[0].id)
         
+        # Voice settings are fixed from here on, so the cache key part that
+        # depends on them is computed once instead of reading the engine per call
+        self._tts_settings = json.dumps([self.engine.getProperty('voice'),
+                                         self.engine.getProperty('rate'),
+                                         self.engine.getProperty('volume')], default=str)
+        
         # Create audio directory if it doesn't exist
         self.audio_dir = "audio_files"
         os.makedirs(self.audio_dir, exist_ok=True)
@@ -49,7 +66,8 @@ class AudioProcessor:
                 audio_bytes = base64.b64decode(audio_data)
                 
                 # Try multiple approaches to process the audio
-                return self._process_audio_data(audio_bytes)
+                result, _ = self._process_audio_data(audio_bytes)
+                return result
                 
             elif audio_file_path:
                 with sr.AudioFile(audio_file_path) as source:
@@ -62,7 +80,12 @@ class AudioProcessor:
             return {'success': False, 'text': '', 'error': f'Error processing audio: {str(e)}'}
     
     def _process_audio_data(self, audio_bytes):
-        """Process audio data with multiple fallback methods"""
+        """
+        Process audio data with multiple fallback methods
+        
+        Returns:
+            tuple: (result dict, name of the decode method that handled the audio or None)
+        """
         import io
         import wave
         import tempfile
@@ -77,7 +100,7 @@ class AudioProcessor:
                     sample_width = wav_file.getsampwidth()
                     
                     audio_source = sr.AudioData(frames, sample_rate, sample_width)
-                    return self._recognize_speech(audio_source)
+                    return self._recognize_speech(audio_source), 'wav'
         except Exception as e:
             print(f"WAV processing failed: {e}")
         
@@ -110,7 +133,7 @@ class AudioProcessor:
                 os.unlink(temp_webm_path)
                 os.unlink(temp_wav_path)
                 
-                return self._recognize_speech(audio_source)
+                return self._recognize_speech(audio_source), 'ffmpeg'
             else:
                 print(f"FFmpeg conversion failed: {result.stderr}")
                 # Clean up temporary files
@@ -137,7 +160,7 @@ class AudioProcessor:
             sample_width = 2  # 16-bit
             
             audio_source = sr.AudioData(audio_bytes, sample_rate, sample_width)
-            return self._recognize_speech(audio_source)
+            return self._recognize_speech(audio_source), 'raw'
         except Exception as e:
             print(f"Raw audio processing failed: {e}")
         
@@ -147,11 +170,11 @@ class AudioProcessor:
                 audio_source = sr.AudioData(audio_bytes, sample_rate, 2)
                 result = self._recognize_speech(audio_source)
                 if result['success']:
-                    return result
+                    return result, 'raw_sample_rate_scan'
             except Exception as e:
                 continue
         
-        return {'success': False, 'text': '', 'error': 'Could not process audio format. Please try recording again.'}
+        return {'success': False, 'text': '', 'error': 'Could not process audio format. Please try recording again.'}, None
     
     def _recognize_speech(self, audio_source):
         """Recognize speech from audio source"""
@@ -182,32 +205,112 @@ class AudioProcessor:
             save_to_file: Whether to save audio to file
             
         Returns:
-            dict: {'success': bool, 'audio_file': str, 'error': str}
+            dict: {'success': bool, 'audio_file': str, 'error': str, 'cached': bool}
         """
         try:
             if save_to_file:
-                # Generate unique filename
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                audio_file = os.path.join(self.audio_dir, f"response_{timestamp}.wav")
+                cache_key = self._tts_cache_key(text)
+                if self.state_store:
+                    cached_file = self.state_store.get_tts_audio(cache_key)
+                    if cached_file:
+                        return {'success': True, 'audio_file': cached_file, 'error': None, 'cached': True}
+                
+                # Name files by content so workers sharing audio_dir never collide
+                audio_file = os.path.join(self.audio_dir, f"response_{cache_key[:16]}.wav")
+                temp_file = os.path.join(self.audio_dir, f".tmp_{uuid.uuid4().hex}.wav")
                 
-                # Save speech to file
-                self.engine.save_to_file(text, audio_file)
-                self.engine.runAndWait()
+                # Save speech to file, then move it into place atomically
+                try:
+                    with self._engine_lock:
+                        self.engine.save_to_file(text, temp_file)
+                        self.engine.runAndWait()
+                    os.replace(temp_file, audio_file)
+                finally:
+                    # Don't leave a partial render behind if synthesis failed
+                    if os.path.exists(temp_file):
+                        os.remove(temp_file)
+                
+                if self.state_store:
+                    self.state_store.put_tts_audio(cache_key, text, audio_file)
                 
                 return {
                     'success': True, 
                     'audio_file': audio_file,
-                    'error': None
+                    'error': None,
+                    'cached': False
                 }
             else:
                 # Just speak without saving
-                self.engine.say(text)
-                self.engine.runAndWait()
+                with self._engine_lock:
+                    self.engine.say(text)
+                    self.engine.runAndWait()
                 return {'success': True, 'audio_file': None, 'error': None}
                 
         except Exception as e:
             return {'success': False, 'audio_file': None, 'error': f'Error in text-to-speech: {str(e)}'}
     
+    def prerender_responses(self, phrases):
+        """
+        Synthesize phrases into the TTS cache ahead of time
+        
+        Args:
+            phrases: Texts to render; ones already cached are skipped
+            
+        Returns:
+            dict: {'rendered': int, 'cached': int, 'failed': int}
+        """
+        rendered = 0
+        cached = 0
+        failed = 0
+        for phrase in phrases:
+            result = self.text_to_speech(phrase, save_to_file=True)
+            if not result['success']:
+                failed += 1
+                print(f"Pre-render failed for '{phrase}': {result['error']}")
+            elif result.get('cached'):
+                cached += 1
+            else:
+                rendered += 1
+        return {'rendered': rendered, 'cached': cached, 'failed': failed}
+    
+    def start_prerender(self, load_phrases, claim_ttl_seconds=600):
+        """
+        Pre-render phrases on a background thread
+        
+        Only the first worker to claim the job within claim_ttl_seconds does
+        the rendering; the others skip it. Without a state store nothing reads
+        the cache, so pre-rendering is skipped entirely.
+        
+        Args:
+            load_phrases: Callable returning the texts to render, run on the thread
+            claim_ttl_seconds: How long one worker's claim on the job lasts
+            
+        Returns:
+            threading.Thread: The started daemon thread, or None if skipped
+        """
+        if not self.state_store:
+            print("Skipping TTS pre-render: no state store to cache audio in")
+            return None
+        
+        def run():
+            try:
+                if not self.state_store.try_claim('tts_prerender', claim_ttl_seconds):
+                    return
+                result = self.prerender_responses(load_phrases())
+                print(f"Pre-rendered {result['rendered']} TTS responses "
+                      f"({result['cached']} already cached, {result['failed']} failed)")
+            except Exception as e:
+                print(f"Error pre-rendering TTS responses: {str(e)}")
+        
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+    
+    def _tts_cache_key(self, text):
+        """Hash the text together with the voice settings that affect the audio"""
+        settings = json.dumps([text, self._tts_settings])
+        return hashlib.sha256(settings.encode('utf-8')).hexdigest()
+    
     def get_audio_base64(self, audio_file_path):
         """
         Convert audio file to base64 string for web transmission
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Offline decode-path benchmark for AudioProcessor._process_audio_data
+
+Generates a corpus of WAV/WebM/Ogg/MP3 clips at several sample rates and
+lengths, runs the decoded upload bytes of each through _process_audio_data
+(the part of speech_to_text after base64 decoding) with recorded
+recognize_google responses replayed from a fixture file, and reports which
+decode method handled each clip. Exits non-zero if any clip falls through to
+the raw sample-rate fallbacks, or if ffmpeg is missing or cannot encode a clip.
+
+"bytes copied" counts the audio buffers each decode path materializes:
+- the upload written to a temp file for ffmpeg (every path after WAV, since
+  the raw fallbacks only run once ffmpeg has been tried)
+- the ffmpeg WAV output read back through record() (ffmpeg path)
+- the frame data handed to each recognize_google call, which the recognizer
+  re-encodes once per call (every path; the raw fallbacks re-wrap the whole
+  upload for each call they make)
+
+Usage:
+    python benchmark_audio.py                      # replay (offline)
+    python benchmark_audio.py --wav-only           # skip ffmpeg-encoded clips
+    python benchmark_audio.py --clips-dir uploads  # also run real uploads
+    python benchmark_audio.py --record             # record real responses
+"""
+
+import os
+import sys
+import json
+import time
+import wave
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+import speech_recognition as sr
+
+from audio_processor import AudioProcessor
+
+SAMPLE_RATES = [8000, 16000, 44100, 48000]
+DURATIONS = [1, 5, 15]
+
+# ffmpeg encoder arguments per container, matching what browsers upload
+FORMATS = {
+    'webm': ['-c:a', 'libopus'],
+    'ogg': ['-c:a', 'libopus'],
+    'mp3': ['-c:a', 'libmp3lame'],
+}
+
+# Decode method each container is expected to take
+EXPECTED_METHODS = {
+    'wav': 'wav',
+    'webm': 'ffmpeg',
+    'ogg': 'ffmpeg',
+    'mp3': 'ffmpeg',
+}
+
+DEFAULT_FIXTURES = 'recognizer_fixtures.json'
+# The generated clips are pure tones, which is what Google answers for them.
+# Failing every call also makes the fallback paths pay their full call count.
+DEFAULT_RESPONSE = {'error': 'UnknownValueError'}
+
+
+class ReplayRecognizer(sr.Recognizer):
+    def __init__(self, fixtures):
+        """
+        sr.Recognizer that replays recorded recognize_google responses
+
+        Everything except recognize_google (e.g. record() on the ffmpeg path)
+        is the real sr.Recognizer behaviour.
+
+        Args:
+            fixtures: Dict of clip name -> list of recorded responses
+        """
+        super().__init__()
+        self.fixtures = fixtures
+        self.clip = None
+        self.calls = 0
+        self.bytes_received = 0
+        self.bytes_read_back = 0
+
+    def reset(self, clip):
+        self.clip = clip
+        self.calls = 0
+        self.bytes_received = 0
+        self.bytes_read_back = 0
+
+    def record(self, source, duration=None, offset=None):
+        audio_source = super().record(source, duration=duration, offset=offset)
+        self.bytes_read_back += len(audio_source.frame_data)
+        return audio_source
+
+    def _replay(self, response):
+        if 'text' in response:
+            return response['text']
+        if response.get('error') == 'RequestError':
+            raise sr.RequestError(response.get('message', ''))
+        raise sr.UnknownValueError()
+
+    def recognize_google(self, audio_source, language='en-US'):
+        responses = self.fixtures.get(self.clip) or [DEFAULT_RESPONSE]
+        response = responses[min(self.calls, len(responses) - 1)]
+        self.calls += 1
+        self.bytes_received += len(audio_source.frame_data)
+        return self._replay(response)
+
+
+class RecordingRecognizer(ReplayRecognizer):
+    """Calls the real recognizer and records its responses as fixtures"""
+
+    def reset(self, clip):
+        super().reset(clip)
+        self.fixtures[clip] = []
+
+    def recognize_google(self, audio_source, language='en-US'):
+        self.calls += 1
+        self.bytes_received += len(audio_source.frame_data)
+        try:
+            text = sr.Recognizer.recognize_google(self, audio_source, language=language)
+            self.fixtures[self.clip].append({'text': text})
+            return text
+        except sr.UnknownValueError:
+            self.fixtures[self.clip].append({'error': 'UnknownValueError'})
+            raise
+        except sr.RequestError as e:
+            self.fixtures[self.clip].append({'error': 'RequestError', 'message': str(e)})
+            raise
+
+
+def write_wav(path, sample_rate, duration):
+    """Write a mono 16-bit 440 Hz tone"""
+    t = np.arange(int(sample_rate * duration)) / sample_rate
+    samples = (np.sin(2 * np.pi * 440 * t) * 0.3 * 32767).astype('<i2')
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(samples.tobytes())
+
+
+def generate_corpus(corpus_dir, wav_only=False):
+    """
+    Generate the synthetic clip corpus
+
+    Args:
+        corpus_dir: Directory to write clips into
+        wav_only: Skip the ffmpeg-encoded formats on purpose
+
+    Returns:
+        tuple: (list of (clip name, path, format) tuples, list of encode errors)
+    """
+    clips = []
+    errors = []
+    if not wav_only and shutil.which('ffmpeg') is None:
+        # Without ffmpeg real WebM/Ogg/MP3 uploads fall through to the raw path
+        errors.append("ffmpeg not found on PATH (use --wav-only to skip non-WAV clips)")
+        wav_only = True
+
+    for sample_rate in SAMPLE_RATES:
+        for duration in DURATIONS:
+            base = f"tone_{sample_rate}hz_{duration}s"
+            wav_path = os.path.join(corpus_dir, f"{base}.wav")
+            write_wav(wav_path, sample_rate, duration)
+            clips.append((f"{base}.wav", wav_path, 'wav'))
+            if wav_only:
+                continue
+
+            for fmt, codec_args in FORMATS.items():
+                path = os.path.join(corpus_dir, f"{base}.{fmt}")
+                # Opus only supports a fixed set of rates, so let ffmpeg resample
+                result = subprocess.run(
+                    ['ffmpeg', '-i', wav_path] + codec_args + [path, '-y'],
+                    capture_output=True, text=True
+                )
+                if result.returncode == 0:
+                    clips.append((f"{base}.{fmt}", path, fmt))
+                else:
+                    detail = result.stderr.strip().splitlines()[-1:] or ['unknown error']
+                    errors.append(f"Could not encode {base}.{fmt}: {detail[0]}")
+    return clips, errors
+
+
+def load_clips_dir(clips_dir):
+    """Collect real recorded uploads from a directory"""
+    clips = []
+    for filename in sorted(os.listdir(clips_dir)):
+        fmt = os.path.splitext(filename)[1].lstrip('.').lower()
+        if fmt in EXPECTED_METHODS:
+            clips.append((filename, os.path.join(clips_dir, filename), fmt))
+    return clips
+
+
+def make_processor(recognizer):
+    """Build an AudioProcessor without initializing the TTS engine"""
+    # pyttsx3 needs a speech driver, which the offline benchmark does not
+    processor = AudioProcessor.__new__(AudioProcessor)
+    processor.recognizer = recognizer
+    return processor
+
+
+def run_clip(processor, recognizer, name, path, fmt):
+    """Run one clip through _process_audio_data and collect metrics"""
+    with open(path, 'rb') as clip_file:
+        audio_bytes = clip_file.read()
+
+    recognizer.reset(name)
+    start = time.perf_counter()
+    result, method = processor._process_audio_data(audio_bytes)
+    elapsed = time.perf_counter() - start
+
+    # See the module docstring for what counts as a copy
+    temp_file_bytes = len(audio_bytes) if method != 'wav' else 0
+    bytes_copied = temp_file_bytes + recognizer.bytes_read_back + recognizer.bytes_received
+
+    return {
+        'clip': name,
+        'format': fmt,
+        'input_bytes': len(audio_bytes),
+        'decode_method': method,
+        'expected_method': EXPECTED_METHODS[fmt],
+        'decode_ms': round(elapsed * 1000, 2),
+        'recognizer_calls': recognizer.calls,
+        'bytes_copied': bytes_copied,
+        'success': result['success'],
+        'regression': method != EXPECTED_METHODS[fmt]
+    }
+
+
+def print_report(results):
+    header = f"{'clip':<32} {'method':<22} {'ms':>9} {'calls':>6} {'bytes copied':>13}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        flag = "  ❌ expected " + r['expected_method'] if r['regression'] else ""
+        print(f"{r['clip']:<32} {str(r['decode_method']):<22} {r['decode_ms']:>9.2f} "
+              f"{r['recognizer_calls']:>6} {r['bytes_copied']:>13}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES,
+                        help='Recorded recognize_google responses (JSON)')
+    parser.add_argument('--clips-dir', help='Directory of real recorded uploads to include')
+    parser.add_argument('--record', action='store_true',
+                        help='Call the real recognizer and save its responses to --fixtures')
+    parser.add_argument('--wav-only', action='store_true',
+                        help='Only generate WAV clips (skips the ffmpeg decode path)')
+    parser.add_argument('--json', dest='json_output', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    fixtures = {}
+    if os.path.exists(args.fixtures):
+        with open(args.fixtures, 'r') as fixtures_file:
+            fixtures = json.load(fixtures_file)
+
+    recognizer = RecordingRecognizer(fixtures) if args.record else ReplayRecognizer(fixtures)
+    processor = make_processor(recognizer)
+
+    print("🎤 Audio Decode Path Benchmark")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        clips, errors = generate_corpus(corpus_dir, wav_only=args.wav_only)
+        if errors:
+            for error in errors:
+                print(f"❌ {error}")
+            sys.exit(1)
+        if args.clips_dir:
+            clips += load_clips_dir(args.clips_dir)
+
+        results = [run_clip(processor, recognizer, *clip) for clip in clips]
+
+    print()
+    print_report(results)
+
+    if args.record:
+        with open(args.fixtures, 'w') as fixtures_file:
+            json.dump(fixtures, fixtures_file, indent=2, sort_keys=True)
+        print(f"\n💾 Recorded responses saved to {args.fixtures}")
+
+    if args.json_output:
+        with open(args.json_output, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+    regressions = [r for r in results if r['regression']]
+    if regressions:
+        print(f"\n❌ {len(regressions)} clip(s) took an unexpected decode path")
+        sys.exit(1)
+    print(f"\n✅ All {len(results)} clips took the expected decode path")
+
+
+if __name__ == "__main__":
+    main()
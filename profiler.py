@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id, interval=0.005):
+        """
+        Periodically sample the Python stack of a single thread
+
+        Args:
+            thread_id: Ident of the thread to sample
+            interval: Seconds between samples
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = {}
+        self.stage = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background sampling thread"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the sampling thread to exit"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                filename = os.path.basename(code.co_filename)
+                stack.append(f"{code.co_name} ({filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.reverse()
+
+            # Tag the root of every sample with the current stage so
+            # flamegraphs split cleanly at stage boundaries
+            stage = self.stage or 'request'
+            key = ';'.join([f"stage:{stage}"] + stack)
+            self.samples[key] = self.samples.get(key, 0) + 1
+
+
+class RequestProfile:
+    def __init__(self, request_id, endpoint, interval=0.005):
+        """
+        Profile a single request on the current thread
+
+        Args:
+            request_id: Identifier used to tag the profile
+            endpoint: Name of the endpoint being profiled
+            interval: Seconds between stack samples
+        """
+        self.request_id = request_id
+        self.endpoint = endpoint
+        self.started_at = datetime.now().isoformat()
+        self.stages = []
+        self._start_time = time.perf_counter()
+        self._sampler = SamplingProfiler(threading.get_ident(), interval)
+        self._sampler.start()
+
+    @contextmanager
+    def stage(self, name):
+        """Mark a stage boundary (e.g. speech_to_text, llm, text_to_speech)"""
+        previous = self._sampler.stage
+        self._sampler.stage = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._sampler.stage = previous
+            self.stages.append({
+                'name': name,
+                'start_ms': round((start - self._start_time) * 1000, 3),
+                'duration_ms': round((end - start) * 1000, 3)
+            })
+
+    def finish(self):
+        """
+        Stop sampling and return the collected profile
+
+        Returns:
+            dict: Profile metadata plus collapsed stack samples
+        """
+        self._sampler.stop()
+        return {
+            'request_id': self.request_id,
+            'endpoint': self.endpoint,
+            'started_at': self.started_at,
+            'duration_ms': round((time.perf_counter() - self._start_time) * 1000, 3),
+            'interval_ms': self._sampler.interval * 1000,
+            'stages': self.stages,
+            'samples': self._sampler.samples
+        }
+
+
+class NullProfile:
+    """Stand-in used when a request is not being profiled"""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def finish(self):
+        return None
+
+
+class ProfileStore:
+    def __init__(self, profile_dir="profiles", max_profiles=50):
+        """
+        Bounded on-disk ring buffer of request profiles
+
+        Args:
+            profile_dir: Directory to write profiles into
+            max_profiles: Maximum number of profiles to keep (at least 1)
+        """
+        if max_profiles < 1:
+            raise ValueError(f"max_profiles must be at least 1, got {max_profiles}")
+        self.profile_dir = profile_dir
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+        os.makedirs(self.profile_dir, exist_ok=True)
+
+    def _path(self, profile_id, extension):
+        return os.path.join(self.profile_dir, f"{profile_id}.{extension}")
+
+    def save(self, profile):
+        """
+        Write a profile as a collapsed-stack file plus a JSON sidecar
+
+        Args:
+            profile: Dict returned by RequestProfile.finish()
+
+        Returns:
+            str: Identifier of the stored profile
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        # The id comes from a client header; strip anything that would break the
+        # filename or the collapsed format's ';' frame and ' count' separators
+        safe_request_id = ''.join(c for c in profile['request_id'] if c.isalnum() or c in '-_')
+        profile_id = f"{timestamp}_{safe_request_id}"
+
+        collapsed = '\n'.join(
+            f"request:{safe_request_id};{stack} {count}"
+            for stack, count in profile['samples'].items()
+        )
+        meta = {key: value for key, value in profile.items() if key != 'samples'}
+        meta['id'] = profile_id
+        meta['sample_count'] = sum(profile['samples'].values())
+
+        with self._lock:
+            with open(self._path(profile_id, 'collapsed'), 'w') as collapsed_file:
+                collapsed_file.write(collapsed + '\n' if collapsed else '')
+            with open(self._path(profile_id, 'json'), 'w') as meta_file:
+                json.dump(meta, meta_file)
+            self._evict()
+
+        return profile_id
+
+    def _evict(self):
+        profile_ids = self._profile_ids()
+        excess = max(len(profile_ids) - self.max_profiles, 0)
+        for profile_id in profile_ids[:excess]:
+            for extension in ('collapsed', 'json'):
+                try:
+                    os.remove(self._path(profile_id, extension))
+                except OSError:
+                    pass
+
+    def _profile_ids(self):
+        # Ids start with a timestamp, so lexical order is chronological
+        return sorted(
+            filename[:-len('.json')]
+            for filename in os.listdir(self.profile_dir)
+            if filename.endswith('.json')
+        )
+
+    def list(self):
+        """
+        List stored profiles, newest first
+
+        Returns:
+            list: Profile metadata dicts
+        """
+        profiles = []
+        for profile_id in reversed(self._profile_ids()):
+            try:
+                with open(self._path(profile_id, 'json'), 'r') as meta_file:
+                    profiles.append(json.load(meta_file))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def get_collapsed(self, profile_id):
+        """
+        Read the collapsed-stack text of a stored profile
+
+        Args:
+            profile_id: Identifier returned by save()
+
+        Returns:
+            str: Collapsed stacks, or None if the profile does not exist
+        """
+        if os.path.basename(profile_id) != profile_id:
+            return None
+        try:
+            with open(self._path(profile_id, 'collapsed'), 'r') as collapsed_file:
+                return collapsed_file.read()
+        except OSError:
+            return None
+
+
+class ProfileManager:
+    def __init__(self, store, sample_rate=0.0, header='X-Profile', interval=0.005):
+        """
+        Decide which requests get profiled and persist the results
+
+        Args:
+            store: ProfileStore to write finished profiles to
+            sample_rate: Fraction of requests to profile without the header
+            header: Request header that forces profiling when set to 1/true and allowed
+            interval: Seconds between stack samples
+        """
+        self.store = store
+        self.sample_rate = sample_rate
+        self.header = header
+        self.interval = interval
+
+    def should_profile(self, headers, header_allowed=False):
+        """Check the opt-in header first, then fall back to random sampling"""
+        value = headers.get(self.header, '').strip().lower()
+        if header_allowed and value in ('1', 'true', 'yes'):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, request_id, endpoint, headers, header_allowed=False):
+        """
+        Start profiling a request if it opted in or was sampled
+
+        Args:
+            request_id: Identifier used to tag the profile
+            endpoint: Name of the endpoint being profiled
+            headers: Request headers
+            header_allowed: Honor the opt-in header (only for authenticated callers)
+
+        Returns:
+            RequestProfile or NullProfile
+        """
+        if not self.should_profile(headers, header_allowed):
+            return NullProfile()
+        return RequestProfile(request_id, endpoint, self.interval)
+
+    def finish(self, profile):
+        """
+        Finish a profile and store it
+
+        Returns:
+            str: Stored profile id, or None if the request was not profiled
+        """
+        result = profile.finish()
+        if result is None:
+            return None
+        try:
+            return self.store.save(result)
+        except Exception as e:
+            print(f"Error saving profile: {str(e)}")
+            return None
@@ -0,0 +1,313 @@
+import os
+import sqlite3
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+
+class StateStore:
+    def __init__(self, db_path="chatbot_state.db", max_cached_conversations=256, freshness_seconds=1.0):
+        """
+        Conversation history and TTS cache metadata shared across worker processes
+
+        Every worker opens the same SQLite database. Each conversation carries a
+        version taken from a store-wide counter on every write (so versions are
+        never reused, even after a delete), and each worker keeps a small
+        read-through cache of message lists keyed by that version, so a history
+        read only costs a primary-key version lookup unless another worker has
+        changed the conversation. Within freshness_seconds of the last check a
+        cached conversation is served without touching the database at all, so
+        another worker's writes may take up to that long to become visible here
+        (this worker's own writes are visible immediately).
+
+        Args:
+            db_path: Path to the shared SQLite database
+            max_cached_conversations: Size of this worker's local LRU cache
+            freshness_seconds: How long a cached conversation is trusted before
+                its version is re-checked (0 checks on every read)
+        """
+        self.db_path = db_path
+        self.max_cached_conversations = max_cached_conversations
+        self.freshness_seconds = freshness_seconds
+        self._local = threading.local()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._create_tables()
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _create_tables(self):
+        conn = self._connection()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                conversation_id TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                sender TEXT NOT NULL,
+                message TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                PRIMARY KEY (conversation_id, id)
+            );
+            CREATE TABLE IF NOT EXISTS version_counter (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO version_counter (id, value) VALUES (1, 0);
+            CREATE TABLE IF NOT EXISTS tts_cache (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                audio_file TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS claims (
+                name TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            );
+        """)
+
+    def _cache_put(self, conversation_id, version, messages):
+        with self._cache_lock:
+            self._cache[conversation_id] = (version, messages, time.monotonic())
+            self._cache.move_to_end(conversation_id)
+            while len(self._cache) > self.max_cached_conversations:
+                self._cache.popitem(last=False)
+
+    def _cache_get(self, conversation_id):
+        with self._cache_lock:
+            entry = self._cache.get(conversation_id)
+            if entry is not None:
+                self._cache.move_to_end(conversation_id)
+            return entry
+
+    def _cache_drop(self, conversation_id):
+        with self._cache_lock:
+            self._cache.pop(conversation_id, None)
+
+    def get_messages(self, conversation_id):
+        """
+        Get the message history of a conversation
+
+        Args:
+            conversation_id: Conversation identifier
+
+        Returns:
+            list: Message dicts, oldest first (empty if the conversation does not exist)
+        """
+        cached = self._cache_get(conversation_id)
+        if cached is not None and time.monotonic() - cached[2] < self.freshness_seconds:
+            return list(cached[1])
+
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT version FROM conversations WHERE id = ?', (conversation_id,)
+        ).fetchone()
+        if row is None:
+            self._cache_drop(conversation_id)
+            return []
+
+        if cached is not None and cached[0] == row['version']:
+            # Still current, so just restart the freshness window
+            self._cache_put(conversation_id, cached[0], cached[1])
+            return list(cached[1])
+
+        # Read the version and rows in one snapshot so they agree
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute(
+                'SELECT version FROM conversations WHERE id = ?', (conversation_id,)
+            ).fetchone()
+            rows = conn.execute(
+                'SELECT id, sender, message, timestamp FROM messages '
+                'WHERE conversation_id = ? ORDER BY id', (conversation_id,)
+            ).fetchall()
+        finally:
+            conn.execute('COMMIT')
+
+        if row is None:
+            self._cache_drop(conversation_id)
+            return []
+
+        messages = [dict(r) for r in rows]
+        self._cache_put(conversation_id, row['version'], messages)
+        return list(messages)
+
+    def append_message(self, conversation_id, sender, message):
+        """
+        Append a message to a conversation, creating it if needed
+
+        Args:
+            conversation_id: Conversation identifier
+            sender: 'user' or 'bot'
+            message: Message text
+
+        Returns:
+            dict: The stored message, including its id
+        """
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front so ids stay sequential across workers
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT version FROM conversations WHERE id = ?', (conversation_id,)
+            ).fetchone()
+            old_version = row['version'] if row else None
+            conn.execute('UPDATE version_counter SET value = value + 1 WHERE id = 1')
+            new_version = conn.execute(
+                'SELECT value FROM version_counter WHERE id = 1'
+            ).fetchone()[0]
+            conn.execute(
+                'INSERT OR REPLACE INTO conversations (id, version) VALUES (?, ?)',
+                (conversation_id, new_version)
+            )
+
+            next_id = conn.execute(
+                'SELECT COALESCE(MAX(id), 0) + 1 FROM messages WHERE conversation_id = ?',
+                (conversation_id,)
+            ).fetchone()[0]
+            new_message = {
+                'id': next_id,
+                'sender': sender,
+                'message': message,
+                'timestamp': datetime.now().isoformat()
+            }
+            conn.execute(
+                'INSERT INTO messages (conversation_id, id, sender, message, timestamp) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (conversation_id, next_id, sender, message, new_message['timestamp'])
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        # Extend our cached copy only if nobody else wrote in between
+        cached = self._cache_get(conversation_id)
+        if cached is not None and cached[0] == old_version:
+            self._cache_put(conversation_id, new_version, cached[1] + [new_message])
+        elif old_version is None:
+            self._cache_put(conversation_id, new_version, [new_message])
+
+        return new_message
+
+    def list_conversations(self):
+        """
+        List all conversation ids
+
+        Returns:
+            list: Conversation identifiers
+        """
+        rows = self._connection().execute('SELECT id FROM conversations ORDER BY id').fetchall()
+        return [r['id'] for r in rows]
+
+    def delete_conversation(self, conversation_id):
+        """
+        Delete a conversation and its messages
+
+        Returns:
+            bool: True if the conversation existed
+        """
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            deleted = conn.execute(
+                'DELETE FROM conversations WHERE id = ?', (conversation_id,)
+            ).rowcount
+            conn.execute('DELETE FROM messages WHERE conversation_id = ?', (conversation_id,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._cache_drop(conversation_id)
+        return deleted > 0
+
+    def try_claim(self, name, ttl_seconds):
+        """
+        Claim a one-off job so only one worker process runs it
+
+        Args:
+            name: Job name
+            ttl_seconds: How long the claim lasts before another worker may take it
+
+        Returns:
+            bool: True if this caller now holds the claim
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT expires_at FROM claims WHERE name = ?', (name,)).fetchone()
+            if row is not None and row['expires_at'] > now:
+                conn.execute('COMMIT')
+                return False
+            conn.execute(
+                'INSERT OR REPLACE INTO claims (name, expires_at) VALUES (?, ?)',
+                (name, now + ttl_seconds)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return True
+
+    def most_frequent_messages(self, sender='bot', limit=20):
+        """
+        Get the most frequently sent messages across all conversations
+
+        Args:
+            sender: Only count messages from this sender
+            limit: Maximum number of messages to return
+
+        Returns:
+            list: Message texts, most frequent first
+        """
+        rows = self._connection().execute(
+            'SELECT message FROM messages WHERE sender = ? '
+            'GROUP BY message ORDER BY COUNT(*) DESC, MAX(timestamp) DESC LIMIT ?',
+            (sender, limit)
+        ).fetchall()
+        return [r['message'] for r in rows]
+
+    def get_tts_audio(self, key):
+        """
+        Look up a cached TTS rendering
+
+        Args:
+            key: Cache key of the text and voice settings
+
+        Returns:
+            str: Path to the cached audio file, or None
+        """
+        conn = self._connection()
+        row = conn.execute('SELECT audio_file FROM tts_cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        if not os.path.exists(row['audio_file']):
+            # The file was cleaned up, so the entry is stale
+            conn.execute('DELETE FROM tts_cache WHERE key = ?', (key,))
+            return None
+        return row['audio_file']
+
+    def put_tts_audio(self, key, text, audio_file):
+        """Record a TTS rendering in the shared cache"""
+        self._connection().execute(
+            'INSERT OR REPLACE INTO tts_cache (key, text, audio_file, created_at) '
+            'VALUES (?, ?, ?, ?)',
+            (key, text, audio_file, datetime.now().isoformat())
+        )
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the shared TTS cache in AudioProcessor.text_to_speech
+"""
+
+import os
+import time
+import tempfile
+import threading
+
+import pytest
+
+pytest.importorskip('speech_recognition')
+pytest.importorskip('pyttsx3')
+
+import audio_processor
+from state_store import StateStore
+
+
+class FakeEngine:
+    """Stand-in for a pyttsx3 engine that writes a small file per render"""
+
+    def __init__(self, fail=False, release=None):
+        self.properties = {'voices': [], 'voice': 'default', 'rate': 200, 'volume': 1.0}
+        self.fail = fail
+        self.release = release
+        self.rendering = threading.Event()
+        self.renders = 0
+        self._pending = None
+
+    def getProperty(self, name):
+        return self.properties[name]
+
+    def setProperty(self, name, value):
+        self.properties[name] = value
+
+    def save_to_file(self, text, path):
+        self._pending = (text, path)
+
+    def runAndWait(self):
+        text, path = self._pending
+        if self.release is not None:
+            # Simulate a slow synthesis that holds the engine
+            self.rendering.set()
+            self.release.wait(5)
+        with open(path, 'wb') as f:
+            f.write(b'RIFF' + text.encode('utf-8'))
+        self.renders += 1
+        if self.fail:
+            raise RuntimeError('driver crashed')
+
+
+def make_processor(monkeypatch, audio_dir, engine, state_store):
+    monkeypatch.chdir(audio_dir)
+    monkeypatch.setattr(audio_processor.pyttsx3, 'init', lambda: engine)
+    return audio_processor.AudioProcessor(state_store=state_store)
+
+
+def test_tts_cache_hit_and_miss(monkeypatch):
+    """A second worker reuses the first worker's content-named render"""
+    with tempfile.TemporaryDirectory() as audio_dir:
+        store = StateStore(os.path.join(audio_dir, 'state.db'))
+        engine = FakeEngine()
+        processor = make_processor(monkeypatch, audio_dir, engine, store)
+
+        first = processor.text_to_speech('Hello there')
+        assert first['success']
+        cache_key = processor._tts_cache_key('Hello there')
+        assert first['audio_file'] == os.path.join('audio_files', f"response_{cache_key[:16]}.wav")
+        assert engine.renders == 1
+
+        other_engine = FakeEngine()
+        other_worker = make_processor(monkeypatch, audio_dir, other_engine, StateStore(store.db_path))
+        second = other_worker.text_to_speech('Hello there')
+        assert second['audio_file'] == first['audio_file']
+        assert other_engine.renders == 0
+
+        processor.text_to_speech('Something else')
+        assert engine.renders == 2
+
+        print("✅ TTS cache hits skip synthesis and misses render once")
+
+
+def test_tts_failed_render_cleans_up(monkeypatch):
+    """A failed render leaves no temp file and no cache entry"""
+    with tempfile.TemporaryDirectory() as audio_dir:
+        store = StateStore(os.path.join(audio_dir, 'state.db'))
+        processor = make_processor(monkeypatch, audio_dir, FakeEngine(fail=True), store)
+
+        result = processor.text_to_speech('Hello there')
+        assert not result['success']
+        assert os.listdir(processor.audio_dir) == []
+        assert store.get_tts_audio(processor._tts_cache_key('Hello there')) is None
+
+        print("✅ Failed renders are cleaned up")
+
+
+def test_tts_cache_hit_does_not_wait_on_render(monkeypatch):
+    """Cached replies are served while a background render holds the engine"""
+    with tempfile.TemporaryDirectory() as audio_dir:
+        store = StateStore(os.path.join(audio_dir, 'state.db'))
+        release = threading.Event()
+        engine = FakeEngine(release=release)
+        processor = make_processor(monkeypatch, audio_dir, engine, store)
+
+        release.set()
+        processor.text_to_speech('Hello there')
+        release.clear()
+
+        render = threading.Thread(target=processor.text_to_speech, args=('Slow reply',))
+        render.start()
+        assert engine.rendering.wait(5)
+        try:
+            start = time.perf_counter()
+            result = processor.text_to_speech('Hello there')
+            elapsed = time.perf_counter() - start
+        finally:
+            release.set()
+            render.join()
+
+        assert result['success']
+        assert elapsed < 1
+        assert engine.renders == 2
+
+        print(f"✅ Cache hit served in {elapsed * 1000:.1f} ms during a render")
+
+
+def test_prerender_runs_in_one_worker(monkeypatch):
+    """Only the worker that claims the job loads phrases and renders them"""
+    with tempfile.TemporaryDirectory() as audio_dir:
+        store = StateStore(os.path.join(audio_dir, 'state.db'))
+        engines = [FakeEngine(), FakeEngine()]
+        loads = []
+
+        def load_phrases():
+            loads.append(threading.get_ident())
+            return ['Hello!', 'Goodbye!']
+
+        threads = []
+        for engine in engines:
+            worker = make_processor(monkeypatch, audio_dir, engine, StateStore(store.db_path))
+            threads.append(worker.start_prerender(load_phrases))
+        for thread in threads:
+            thread.join()
+
+        assert len(loads) == 1
+        assert sorted(e.renders for e in engines) == [0, 2]
+        assert all(t != threading.get_ident() for t in loads)
+
+        print("✅ Pre-rendering ran once, on a background thread")
+
+
+def test_prerender_counts_cache_hits(monkeypatch):
+    """Already cached phrases are reported separately from new renders"""
+    with tempfile.TemporaryDirectory() as audio_dir:
+        store = StateStore(os.path.join(audio_dir, 'state.db'))
+        engine = FakeEngine()
+        processor = make_processor(monkeypatch, audio_dir, engine, store)
+
+        processor.text_to_speech('Hello!')
+        result = processor.prerender_responses(['Hello!', 'Goodbye!'])
+        assert result == {'rendered': 1, 'cached': 1, 'failed': 0}
+        assert engine.renders == 2
+
+        print("✅ Pre-render counts cache hits separately")
+
+
+def test_prerender_skipped_without_state_store(monkeypatch):
+    """Without a store nothing reads the cache, so nothing is pre-rendered"""
+    with tempfile.TemporaryDirectory() as audio_dir:
+        engine = FakeEngine()
+        processor = make_processor(monkeypatch, audio_dir, engine, None)
+
+        assert processor.start_prerender(lambda: ['Hello!']) is None
+        assert engine.renders == 0
+
+        print("✅ Pre-render skipped without a state store")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the decode-path benchmark on an ffmpeg-encoded clip
+"""
+
+import os
+import shutil
+import tempfile
+import subprocess
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('speech_recognition')
+pytest.importorskip('pyttsx3')
+
+import benchmark_audio
+
+
+def test_webm_clip_takes_ffmpeg_path():
+    """A WebM clip decodes through ffmpeg with a single recognizer call"""
+    if shutil.which('ffmpeg') is None:
+        pytest.skip('ffmpeg not installed')
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        wav_path = os.path.join(corpus_dir, 'tone.wav')
+        webm_path = os.path.join(corpus_dir, 'tone.webm')
+        benchmark_audio.write_wav(wav_path, 16000, 1)
+        result = subprocess.run(
+            ['ffmpeg', '-i', wav_path, '-c:a', 'libopus', webm_path, '-y'],
+            capture_output=True, text=True
+        )
+        assert result.returncode == 0, result.stderr
+
+        recognizer = benchmark_audio.ReplayRecognizer({})
+        processor = benchmark_audio.make_processor(recognizer)
+        metrics = benchmark_audio.run_clip(processor, recognizer, 'tone.webm', webm_path, 'webm')
+
+        assert metrics['decode_method'] == 'ffmpeg'
+        assert metrics['recognizer_calls'] == 1
+        assert not metrics['regression']
+        assert metrics['bytes_copied'] > metrics['input_bytes']
+
+        print(f"✅ WebM clip decoded via ffmpeg in {metrics['decode_ms']} ms")
+
+
+if __name__ == "__main__":
+    test_webm_clip_takes_ffmpeg_path()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test script to verify request profiling and the on-disk profile ring buffer
+"""
+
+import time
+import tempfile
+
+import pytest
+
+from profiler import ProfileManager, ProfileStore, NullProfile
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_profile_ring_buffer():
+    """Profile a few requests and check stage tags and eviction"""
+    with tempfile.TemporaryDirectory() as profile_dir:
+        manager = ProfileManager(ProfileStore(profile_dir, max_profiles=2), interval=0.001)
+
+        # Requests without the header are not profiled at a zero sample rate,
+        # and the header is ignored unless the caller is authorized
+        assert isinstance(manager.start('skipped', 'chat', {}), NullProfile)
+        assert isinstance(manager.start('skipped', 'chat', {'X-Profile': '1'}), NullProfile)
+
+        profile_ids = []
+        for i in range(3):
+            profile = manager.start(f"req-{i}", 'audio_chat', {'X-Profile': '1'}, header_allowed=True)
+            with profile.stage('speech_to_text'):
+                busy_wait(0.03)
+            with profile.stage('llm'):
+                busy_wait(0.03)
+            profile_ids.append(manager.finish(profile))
+
+        profiles = manager.store.list()
+        assert [p['id'] for p in profiles] == profile_ids[:0:-1]
+        assert [s['name'] for s in profiles[0]['stages']] == ['speech_to_text', 'llm']
+
+        collapsed = manager.store.get_collapsed(profile_ids[-1])
+        assert 'request:req-2;stage:speech_to_text;' in collapsed
+        assert 'busy_wait' in collapsed
+        assert manager.store.get_collapsed(profile_ids[0]) is None
+
+        # Client-supplied ids must not break the collapsed format
+        profile = manager.start('bad id;x', 'chat', {'X-Profile': '1'}, header_allowed=True)
+        busy_wait(0.02)
+        profile_id = manager.finish(profile)
+        lines = manager.store.get_collapsed(profile_id).splitlines()
+        assert lines
+        for line in lines:
+            assert line.startswith('request:badidx;stage:')
+            assert line.rsplit(' ', 1)[1].isdigit()
+
+        print(f"✅ Stored {len(profiles)} profiles, newest: {profile_ids[-1]}")
+
+
+def test_profile_store_requires_capacity():
+    """A zero-sized ring buffer would never evict, so it is rejected"""
+    with tempfile.TemporaryDirectory() as profile_dir:
+        with pytest.raises(ValueError):
+            ProfileStore(profile_dir, max_profiles=0)
+
+        store = ProfileStore(profile_dir, max_profiles=1)
+        profile = {'request_id': 'r', 'samples': {'stage:request;main (x.py:1)': 1}}
+        for _ in range(3):
+            store.save(dict(profile))
+        assert len(store.list()) == 1
+
+        print("✅ Ring buffer keeps exactly max_profiles entries")
+
+
+if __name__ == "__main__":
+    test_profile_ring_buffer()
+    test_profile_store_requires_capacity()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test script to verify conversation state is shared between workers
+"""
+
+import os
+import time
+import tempfile
+
+from state_store import StateStore
+
+
+def test_shared_conversations():
+    """Two stores on one database behave like two worker processes"""
+    with tempfile.TemporaryDirectory() as db_dir:
+        db_path = os.path.join(db_dir, 'state.db')
+        worker_a = StateStore(db_path, freshness_seconds=0)
+        worker_b = StateStore(db_path, freshness_seconds=0)
+
+        worker_a.append_message('c1', 'user', 'hello')
+        worker_a.append_message('c1', 'bot', 'hi there')
+        assert [m['message'] for m in worker_b.get_messages('c1')] == ['hello', 'hi there']
+
+        # A write on worker B must invalidate worker A's cached copy
+        assert worker_a.get_messages('c1')[-1]['id'] == 2
+        message = worker_b.append_message('c1', 'user', 'how are you?')
+        assert message['id'] == 3
+        assert [m['id'] for m in worker_a.get_messages('c1')] == [1, 2, 3]
+
+        # Recreating a deleted conversation must not serve the old history
+        assert worker_b.delete_conversation('c1')
+        assert not worker_b.delete_conversation('c1')
+        worker_b.append_message('c1', 'user', 'fresh start')
+        assert [m['message'] for m in worker_a.get_messages('c1')] == ['fresh start']
+        assert worker_a.list_conversations() == ['c1']
+
+        print("✅ Conversations are shared and cache-coherent across workers")
+
+
+def test_freshness_window():
+    """Cached reads skip the database until the freshness window expires"""
+    with tempfile.TemporaryDirectory() as db_dir:
+        db_path = os.path.join(db_dir, 'state.db')
+        worker_a = StateStore(db_path, freshness_seconds=0.2)
+        worker_b = StateStore(db_path, freshness_seconds=0.2)
+
+        worker_a.append_message('c1', 'user', 'hello')
+        assert len(worker_a.get_messages('c1')) == 1
+        worker_b.append_message('c1', 'bot', 'hi there')
+
+        # Within the window worker A serves its cached copy
+        assert len(worker_a.get_messages('c1')) == 1
+
+        # Own writes are visible immediately
+        worker_b.append_message('c1', 'user', 'again')
+        assert len(worker_b.get_messages('c1')) == 3
+
+        time.sleep(0.25)
+        assert len(worker_a.get_messages('c1')) == 3
+
+        print("✅ Freshness window bounds how stale cached history can be")
+
+
+def test_tts_cache_metadata():
+    """Cached TTS entries are shared and dropped once the file is gone"""
+    with tempfile.TemporaryDirectory() as db_dir:
+        store = StateStore(os.path.join(db_dir, 'state.db'))
+        audio_file = os.path.join(db_dir, 'response.wav')
+        with open(audio_file, 'wb') as f:
+            f.write(b'RIFF')
+
+        store.put_tts_audio('key', 'Hello', audio_file)
+        assert StateStore(store.db_path).get_tts_audio('key') == audio_file
+
+        os.remove(audio_file)
+        assert store.get_tts_audio('key') is None
+
+        print("✅ TTS cache metadata is shared across workers")
+
+
+def test_most_frequent_messages():
+    """Frequent bot replies are ranked for TTS pre-rendering"""
+    with tempfile.TemporaryDirectory() as db_dir:
+        store = StateStore(os.path.join(db_dir, 'state.db'))
+        for conversation_id in ('a', 'b', 'c'):
+            store.append_message(conversation_id, 'user', 'hi')
+            store.append_message(conversation_id, 'bot', 'Hello!')
+        store.append_message('a', 'bot', 'Goodbye!')
+        store.append_message('b', 'bot', 'Goodbye!')
+        store.append_message('c', 'bot', 'See you')
+
+        assert store.most_frequent_messages('bot', limit=2) == ['Hello!', 'Goodbye!']
+        assert store.most_frequent_messages('user') == ['hi']
+
+        print("✅ Most frequent bot replies ranked correctly")
+
+
+def test_try_claim():
+    """Only one worker gets a one-off job until its claim expires"""
+    with tempfile.TemporaryDirectory() as db_dir:
+        db_path = os.path.join(db_dir, 'state.db')
+        worker_a = StateStore(db_path)
+        worker_b = StateStore(db_path)
+
+        assert worker_a.try_claim('tts_prerender', ttl_seconds=60)
+        assert not worker_b.try_claim('tts_prerender', ttl_seconds=60)
+        assert worker_b.try_claim('other_job', ttl_seconds=60)
+
+        # An expired claim can be taken over
+        assert worker_a.try_claim('short_job', ttl_seconds=0)
+        assert worker_b.try_claim('short_job', ttl_seconds=60)
+
+        print("✅ Claims are exclusive across workers")
+
+
+if __name__ == "__main__":
+    test_shared_conversations()
+    test_freshness_window()
+    test_tts_cache_metadata()
+    test_most_frequent_messages()
+    test_try_claim()